@@ -1,9 +1,53 @@
 import re
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import re2  # google-re2: optional linear-time (Thompson NFA/DFA) engine
+except ImportError:
+    re2 = None
 
 logger = logging.getLogger(__name__)
 
+# Header normalization: one alternation so the text is scanned only once.
+# Matched headers are keyed with whitespace removed ("final  answer" and
+# "FinalAnswer" both map to "finalanswer").
+_HEADER_RE = re.compile(r"\b(final\s*answer|reasoning|problem)\b", re.I)
+_WS_RE = re.compile(r"\s+")
+_HEADERS = {
+    "finalanswer": "Final Answer",
+    "reasoning": "Reasoning",
+    "problem": "Problem",
+}
+
+
+def _canonical_header(m: "re.Match[str]") -> str:
+    return _HEADERS[_WS_RE.sub("", m.group(1).lower())]
+
+# Literal markers for the strict fast path (matched against lowercased text)
+_PROBLEM_MARK = "problem:"
+_REASONING_MARK = "reasoning:"
+_FINAL_MARK = "final answer:"
+
+# Explicit character classes shared by the stdlib and re2 patterns below.
+# re2's \s and \d are ASCII-only while the stdlib's are Unicode-aware, so
+# spelling them out keeps both engines (and long vs short inputs) in
+# agreement. _WS is exactly the set str.isspace()/str.strip() use; answers
+# must be ASCII digits, as in the prompt format.
+_WS = "[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]"
+_INT = "([+-]?[0-9]+)"
+
+# Whatever follows the last "Final Answer:" must be a bare integer
+_ANSWER_TAIL_RE = re.compile(_WS + "*" + _INT + _WS + r"*\Z")
+
+# Responses longer than this are rejected outright; real teacher outputs
+# are a few KB at most
+_MAX_RESPONSE_CHARS = 100_000
+
+# Slow-path inputs at least this long go to re2 when it is installed; on
+# short inputs the stdlib engine is usually faster
+_RE2_MIN_CHARS = 4096
+
 class ResponseParser:
     """
     Parses teacher outputs of the form:
@@ -19,15 +63,80 @@ class ResponseParser:
     - minimal heuristics to salvage common formatting issues
     """
 
+    # Linear-time layout match. Two lazy (.*?) groups backtrack
+    # super-linearly on malformed output (e.g. many "Reasoning:" markers and
+    # no final answer), so each group is limited to a single choice instead:
+    # the problem cannot run past the first "Reasoning:", and the greedy
+    # reasoning group can only end at the last "Final Answer:" followed by a
+    # bare integer. There is deliberately no whitespace run before either
+    # group: backtracking it one char at a time would rescan the rest of the
+    # input each step. The caller strips the groups instead.
     _SECTION_RE = re.compile(
-        r"(?is)"                       # i=case-insensitive, s=dot matches newline
-        r"Problem:\s*(.*?)\s*"
-        r"Reasoning:\s*(.*?)\s*"
-        r"Final Answer:\s*([+-]?\d+)\s*$"
+        r"\AProblem:((?:(?!Reasoning:).)*)"
+        r"Reasoning:(.*)"
+        r"Final Answer:" + _WS + "*" + _INT + _WS + r"*\Z",
+        re.IGNORECASE | re.DOTALL,     # DOTALL: dot matches newline
     )
 
     # Backup regex if model adds trailing text after the number
-    _FINAL_ANSWER_RE = re.compile(r"(?is)Final Answer:\s*([+-]?\d+)")
+    _FINAL_ANSWER_RE = re.compile("Final Answer:" + _WS + "*" + _INT, re.IGNORECASE | re.DOTALL)
+
+    if re2 is not None:
+        # RE2 has no lookarounds or \Z, but never backtracks, so the plain
+        # lazy layout is safe there. Inline flags are the portable form.
+        _SECTION_RE2 = re2.compile(
+            r"(?is)"                   # i=case-insensitive, s=dot matches newline
+            r"Problem:" + _WS + r"*(.*?)" + _WS + "*"
+            r"Reasoning:" + _WS + r"*(.*?)" + _WS + "*"
+            r"Final Answer:" + _WS + "*" + _INT + _WS + "*$"
+        )
+        _FINAL_ANSWER_RE2 = re2.compile(r"(?is)Final Answer:" + _WS + "*" + _INT)
+    else:
+        _SECTION_RE2 = _FINAL_ANSWER_RE2 = None
+
+    def _slow_path_patterns(self, text: str) -> Tuple[Any, Any]:
+        """Returns (section_re, final_answer_re), preferring re2 for long input."""
+        if self._SECTION_RE2 is not None and len(text) >= _RE2_MIN_CHARS:
+            try:
+                text.encode("utf-8")   # re2 rejects lone surrogates
+            except UnicodeEncodeError:
+                pass
+            else:
+                return self._SECTION_RE2, self._FINAL_ANSWER_RE2
+        return self._SECTION_RE, self._FINAL_ANSWER_RE
+
+    def _scan_sections(
+        self, text: str, lower: str, start: int, end: int
+    ) -> Optional[Tuple[str, str, str]]:
+        """
+        Fast path for well-formed output: locate the literal markers with
+        str.find instead of normalizing headers and running _SECTION_RE.
+        Only text[start:end] is considered, so the caller need not strip.
+
+        Returns:
+            (problem, reasoning, final_answer) slices, or None if the markers
+            are missing or out of order (the caller then uses the regex).
+        """
+        # lower() can change the length of some non-ASCII strings,
+        # which would misalign the offsets below
+        if len(lower) != len(text) or not lower.startswith(_PROBLEM_MARK, start):
+            return None
+
+        p_end = start + len(_PROBLEM_MARK)
+        r = lower.find(_REASONING_MARK, p_end, end)
+        f = lower.rfind(_FINAL_MARK, p_end, end)
+        if r < 0 or f < r + len(_REASONING_MARK):
+            return None
+
+        tail = _ANSWER_TAIL_RE.match(text, f + len(_FINAL_MARK), end)
+        if not tail:
+            return None
+
+        return (
+            text[p_end:r],
+            text[r + len(_REASONING_MARK):f],
+            tail.group(1),
+        )
 
     def parse(self, raw_text: str, strict: bool = True) -> Optional[Dict[str, Any]]:
         """
@@ -39,21 +148,40 @@ class ResponseParser:
         Returns:
             dict or None if parsing fails.
         """
-        if not raw_text or not raw_text.strip():
+        if not raw_text:
             logger.warning("Empty raw_text; cannot parse.")
             return None
 
-        text = raw_text.strip()
+        # Bounds of the stripped text, used as offsets instead of a stripped copy
+        end = len(raw_text.rstrip())
+        start = len(raw_text) - len(raw_text.lstrip()) if end else 0
+
+        if start == end:
+            logger.warning("Empty raw_text; cannot parse.")
+            return None
 
-        text = re.sub(r"(?i)\bfinal\s*answer\b", "Final Answer", text)
-        text = re.sub(r"(?i)\breasoning\b", "Reasoning", text)
-        text = re.sub(r"(?i)\bproblem\b", "Problem", text)
+        if end - start > _MAX_RESPONSE_CHARS:
+            logger.warning(f"Response too long to parse ({end - start} chars).")
+            return None
 
-        m = self._SECTION_RE.match(text)
-        if m:
-            problem = m.group(1).strip()
-            reasoning = m.group(2).strip()
-            final_answer_str = m.group(3).strip()
+        # Cheap literal prefilter before any regex work: every parse needs a
+        # final answer header, and the strict layout needs three "X:" headers
+        lower = raw_text.lower()
+        if "answer" not in lower or (strict and raw_text.count(":", start, end) < 3):
+            logger.warning(f"No plausible section headers. Head: {raw_text[start:start + 120]!r}")
+            return None
+
+        sections = self._scan_sections(raw_text, lower, start, end)
+        if sections is None:
+            # Slow path: canonicalize header spelling, then match the full layout
+            text = _HEADER_RE.sub(_canonical_header, raw_text[start:end])
+            section_re, final_answer_re = self._slow_path_patterns(text)
+            m = section_re.match(text)
+            if m:
+                sections = m.groups()
+
+        if sections:
+            problem, reasoning, final_answer_str = (part.strip() for part in sections)
 
             try:
                 final_answer = int(final_answer_str)
@@ -78,10 +206,17 @@ class ResponseParser:
 
         # Best effort fallback:
         # try to at least find "final asnwer" and split around markers
-        ans_m = self._FINAL_ANSWER_RE.search(text)
+        # (only reached after the slow path, so final_answer_re is bound)
+        ans_m = final_answer_re.search(text)
         if not ans_m:
             logger.warning(f"Best-effort parsing failed: no Final Answer found")
             return None
+
+        # _INT only takes ASCII digits; a non-ASCII digit right after it means
+        # the number was cut short, so reject rather than return a prefix
+        if text[ans_m.end(1):ans_m.end(1) + 1].isdigit():
+            logger.error(f"Best-effor parsing failed: final asnwer not int.")
+            return None
         
         try:
             final_answer = int(ans_m.group(1).strip())
@@ -94,20 +229,18 @@ class ResponseParser:
         problem = ""
         reasoning = ""
 
-        # Split on Reasoning:
-        parts = re.split(r"(?i)\bReasoning:\s*", text, maxsplit=1)
-        if len(parts) == 2:
-            before_reasoning, after_reasoning = parts
+        # Headers are canonical by now, so plain literal partitions are enough
+        before_reasoning, sep, after_reasoning = text.partition("Reasoning:")
+        if sep:
             # Extract problem from before_reasoning after "Problem:"
-            p2 = re.split(r"(?i)\bProblem:\s*", before_reasoning, maxsplit=1)
-            if len(p2) == 2:
-                problem = p2[1].strip()
+            _, _, problem = before_reasoning.partition("Problem:")
+            problem = problem.strip()
 
             # Remove final answer section from reasoning block
-            reasoning = re.split(r"(?i)\bFinal Answer:\s*", after_reasoning, maxsplit=1)[0].strip()
+            reasoning = after_reasoning.partition("Final Answer:")[0].strip()
         else:
             # Could not find Reasoning marker; treat everything before Final Answer as "problem"
-            problem = re.split(r"(?i)\bFinal Answer:\s*", text, maxsplit=1)[0].strip()
+            problem = text.partition("Final Answer:")[0].strip()
 
         return {
             "problem": problem,
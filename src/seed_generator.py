@@ -1,9 +1,12 @@
 import json
 import random
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Dict, Any
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import os
 import re
@@ -19,6 +22,7 @@ class MathProbGenerator:
 
     def __init__(self):
         self.categories = ["linear_equations", "ratio_reasoning", "percentage_logic"]
+        self.rng = np.random.default_rng()
     
     def generate_skeleton(self) -> Dict[str, Any]:
         category = random.choice(self.categories)
@@ -73,6 +77,84 @@ class MathProbGenerator:
         else:
             return {}
 
+    def generate_many(self, n: int) -> Dict[str, Dict[str, np.ndarray]]:
+        """Vectorized generate_skeleton: draws n skeletons at once.
+
+        Returns one struct-of-arrays block per category, holding the variable
+        arrays, the answers, and "index" (each row's position in 0..n-1).
+        Use to_skeletons() to turn a batch back into skeleton dicts.
+        """
+        rng = self.rng
+        category_idx = rng.integers(0, len(self.categories), n)
+        batch = {}
+
+        for ci, category in enumerate(self.categories):
+            index = np.flatnonzero(category_idx == ci)
+            k = len(index)
+
+            if category == "linear_equations":
+                # ax + b = c
+                x = rng.integers(5, 51, k)
+                a = rng.integers(2, 11, k)
+                b = rng.integers(1, 101, k)
+                c = a * x + b
+                batch[category] = {"index": index, "a": a, "b": b, "c": c, "answer": x}
+
+            elif category == "ratio_reasoning":
+                # A/B = X/C
+                p = rng.integers(1, 10, k)
+                q = rng.integers(1, 10, k)
+                kk = rng.integers(2, 11, k)
+                m = rng.integers(2, 11, k)
+                batch[category] = {
+                    "index": index,
+                    "a": p * kk,
+                    "b": q * kk,
+                    "c": q * m,
+                    "answer": p * m,
+                }
+
+            elif category == "percentage_logic":
+                # a * (1+b) * (1+c) = x, with a a multiple of 10,000
+                a = 10000 * rng.integers(1, 6, k)
+                b = rng.integers(-50, 51, k)
+                c = rng.integers(-50, 51, k)
+                x = a * (100 + b) // 100 * (100 + c) // 100
+                batch[category] = {
+                    "index": index,
+                    "base_value": a,
+                    "percent_1": b,
+                    "percent_2": c,
+                    "answer": x,
+                }
+
+        return batch
+
+    @staticmethod
+    def to_skeletons(batch: Dict[str, Dict[str, np.ndarray]]) -> List[Dict[str, Any]]:
+        """Materializes a generate_many batch as skeleton dicts, in draw order."""
+        n = sum(len(block["index"]) for block in batch.values())
+        skeletons: List[Dict[str, Any]] = [{} for _ in range(n)]
+
+        for category, block in batch.items():
+            # tolist() gives plain Python ints, which json.dumps can serialize
+            columns = {name: values.tolist() for name, values in block.items()}
+            index = columns.pop("index")
+            answers = columns.pop("answer")
+            names = list(columns)
+
+            for row, (i, answer) in enumerate(zip(index, answers)):
+                skeleton = {
+                    "category": category,
+                    "variables": {name: columns[name][row] for name in names},
+                    "answer": answer,
+                }
+                if category == "ratio_reasoning":
+                    skeleton["logic_type"] = "solve_for_x"
+                skeletons[i] = skeleton
+
+        return skeletons
+
 class TeacherSynthesizer:
     """Interacts with a 'teacher' LLM to turn skeletons into word problems."""
 
@@ -80,6 +162,14 @@ class TeacherSynthesizer:
         self.api_key = api_key
         self.url = "https://openrouter.ai/api/v1/chat/completions" 
 
+        # one keep-alive session, so sequential calls reuse the TCP/TLS connection
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+        self.session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
         # system prompt
         self.system_prompt = (
             "You are a Mathematical Data Synthesis engine. Your task is to turn raw logic skeletons "
@@ -93,6 +183,25 @@ class TeacherSynthesizer:
             "Final Answer: <number>"
         )
 
+        # few-shot prefix is static per category, so build it once
+        self._prefix_by_category = {
+            category: (
+                f"{self._get_few_shot_examples(category)}\n\n"
+                f"Now generate a new one for:\n"
+                f"Input: variables "
+            )
+            for category in ["linear_equations", "ratio_reasoning", "percentage_logic"]
+        }
+
+        # only the user message changes between requests
+        self._system_message = {"role": "system", "content": self.system_prompt}
+        self._payload_template = {
+            # "model": "mistralai/mistral-7b-instruct:free",
+            "model": "qwen/qwen3-4b:free",
+            "messages": [self._system_message],
+            "temperature": 0.7
+        }
+
     def _get_few_shot_examples(self, category: str) -> str:
         """Provides an example for the model"""
         if category == "linear_equations":
@@ -123,44 +232,23 @@ class TeacherSynthesizer:
 
 
     def create_prompt(self, skeleton: Dict[str, Any]) -> str:
-        example = self._get_few_shot_examples(skeleton["category"])
-        vars = skeleton['variables']
-        prompt = (
-            f"{example}\n\n"
-            f"Now generate a new one for:\n"
-            f"Input: variables {skeleton['variables']}, answer {skeleton['answer']}\n"
-            f"Output:"
-        )
-        return prompt
+        prefix = self._prefix_by_category[skeleton["category"]]
+        variables = skeleton["variables"]
+        answer = skeleton["answer"]
+        return f"{prefix}{variables}, answer {answer}\nOutput:"
     
-    def call_teacher(self, skeleton: Dict[str, Any]) -> str:
-        """
-        API call
-        """
+    def _build_payload(self, skeleton: Dict[str, Any]) -> Dict[str, Any]:
         prompt = self.create_prompt(skeleton)
 
-        payload = {
-            # "model": "mistralai/mistral-7b-instruct:free",
-            "model": "qwen/qwen3-4b:free",
-            "messages": [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7
+        # fresh top-level dict and messages list per call: call_teacher runs on
+        # several threads, so the shared template must never be mutated
+        return {
+            **self._payload_template,
+            "messages": [self._system_message, {"role": "user", "content": prompt}],
         }
 
-        response = requests.post(
-        url= self.url,
-        headers={
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        },
-        data=json.dumps(payload)
-        )
-
-
-        res_json = response.json()
-
+    @staticmethod
+    def _extract_content(res_json: Dict[str, Any]) -> str:
         # Add error handling for API failures
         if "choices" in res_json:
             return res_json["choices"][0]["message"]["content"]
@@ -168,32 +256,98 @@ class TeacherSynthesizer:
             print(f"Error: {res_json}")
             return ""
 
+    def call_teacher(self, skeleton: Dict[str, Any]) -> str:
+        """
+        API call
+        """
+        response = self.session.post(
+            self.url,
+            json=self._build_payload(skeleton),
+            timeout=60,
+        )
+
+        return self._extract_content(response.json())
+
 class DataValidator:
     """Ensures the generated response match the inteded logic"""
 
+    # Pattern looks for "Final Answer:", optional whitespace,
+    # an optional negative sign, and one or more ASCII digits (the same
+    # digits ResponseParser accepts), not followed by any other digit.
+    _FINAL_ANSWER_RE = re.compile(r"Final Answer:\s*(-?[0-9]+)(?!\d)", re.I)
+
     @staticmethod
     def verify_answer(response: str, expected_answer: int) -> bool:
         """
         Use Regex to extract the 'Final Answer' from the response
         and compare it to the expected_answer.
         """
-        # Pattern looks for "Final Answer:", optional whitespace,
-        # an optional negative sign, and one or more digits.
-        pattern = "Final Answer:\s*(-?\d+)"
-        match = re.search(pattern, response, re.IGNORECASE)
-        
-        if match:
-            try:
-                # Extract the first capture group (the number)
-                model_answer = int(match.group(1))
-                return model_answer == expected_answer
-            except ValueError:
-                logging.error(f"Could not convert '{match.group(1)}' to an integer.")
-                return False
-        else:
+        # Cheap literal check first: a correct answer must contain these digits.
+        # abs() because "-07" should still match -7.
+        if str(abs(expected_answer)) not in response:
+            logging.warning(f"Expected answer {expected_answer} not found in response: {response[:50]}...")
+            return False
+
+        match = DataValidator._FINAL_ANSWER_RE.search(response)
+        if match is None:
             logging.warning(f"No 'Final Answer' pattern found in response: {response[:50]}...")
             return False
 
+        # the capture is an optional sign plus digits, so int() cannot fail
+        return int(match.group(1)) == expected_answer
+
+
+def generate_dataset(
+    generator: MathProbGenerator,
+    synthesizer: TeacherSynthesizer,
+    validator: DataValidator,
+    num_samples: int,
+    max_workers: int = 16,
+) -> List[Dict[str, Any]]:
+    """
+    Runs the teacher calls on a thread pool, with at most max_workers
+    requests in flight (OpenRouter rate limit), and validates each response
+    on the main thread as it lands. Entries come back in id order.
+    """
+    dataset = []
+
+    # generate logic
+    skeletons = generator.to_skeletons(generator.generate_many(num_samples))
+
+    # syntehsize word problems; the threads mostly wait on sockets, so the GIL is free
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {
+            ex.submit(synthesizer.call_teacher, skeleton): (i, skeleton)
+            for i, skeleton in enumerate(skeletons)
+        }
+
+        for future in as_completed(futures):
+            i, skeleton = futures[future]
+            try:
+                raw_response = future.result()
+            except Exception as e:
+                # timeouts, connection errors, non-JSON error bodies, ...
+                logging.warning(f"Sample {i} request failed ({e!r}). Skipping.")
+                continue
+
+            # validate
+            if validator.verify_answer(raw_response, skeleton['answer']):
+                entry = {
+                    "id": i,
+                    "instruction": raw_response.partition("Reasoning:")[0].strip(),
+                    "reasoning": raw_response,
+                    "answer": skeleton['answer'],
+                    "metadata": skeleton
+                }
+                dataset.append(entry)
+                logging.info(f"Sample {i} generated and validated.")
+            else:
+                logging.warning(f"Sample {i} failed validation. Skipping.")
+
+    # futures complete in arbitrary order
+    dataset.sort(key=lambda entry: entry["id"])
+    return dataset
+
 
 def main():
     # Configuration
@@ -204,35 +358,13 @@ def main():
     synthesizer = TeacherSynthesizer(api_key=os.getenv('OPEN_ROUTER_API_KEY'))
     validator = DataValidator()
 
-    dataset = []
-
     logging.info(f"Starting generation of {NUM_SAMPLES} samples...")
 
-    for i in range(NUM_SAMPLES):
-        # generate logic
-        skeleton = generator.generate_skeleton()
-
-        # syntehsize word problem
-        prompt = synthesizer.create_prompt(skeleton=skeleton)
-        raw_response = synthesizer.call_teacher(skeleton=skeleton)
-
-        # validate
-        if validator.verify_answer(raw_response, skeleton['answer']):
-            entry = {
-                "id": i,
-                "instruction": raw_response.split("Reasoning:")[0].strip(),
-                "reasoning": raw_response,
-                "answer": skeleton['answer'],
-                "metadata": skeleton
-            }
-            dataset.append(entry)
-            logging.info(f"Sample {i} generated and validated.")
-        else:
-            logging.warning(f"Sample {i} failed validation. Skipping.")
-        
+    dataset = generate_dataset(generator, synthesizer, validator, NUM_SAMPLES)
+
     with open(OUTPUT_FILE, "w") as f:
-        for entry in dataset:
-            f.write(json.dumps(entry) + "\n")
+        # compact separators keep rows small; writelines lets the file buffer batch writes
+        f.writelines(json.dumps(entry, separators=(",", ":")) + "\n" for entry in dataset)
 
     logging.info(f"Saved {len(dataset)} samples to {OUTPUT_FILE}")
 
@@ -0,0 +1,34 @@
+import time
+from response_parser import ResponseParser
+
+
+def test_parses_well_formed_response():
+    parser = ResponseParser()
+    parsed = parser.parse("Problem: p\nReasoning: r\nFinal Answer: -12\n")
+    assert parsed == {"problem": "p", "reasoning": "r", "final_answer": -12}
+
+
+def test_whitespace_padding_is_not_quadratic():
+    # A long whitespace run after a header used to make the stdlib
+    # _SECTION_RE backtrack quadratically (k=8000 took over a second).
+    # Disable re2 so the stdlib engine is what gets timed.
+    parser = ResponseParser()
+    parser._SECTION_RE2 = None
+
+    k = 64_000
+    padded = [
+        "Problem:" + " " * k + "x Reasoning: y Final Answer: z",
+        "Problem: x Reasoning:" + " " * k + "y Final Answer: z",
+        "Problem: x Reasoning: y Final Answer:" + " " * k + "z",
+    ]
+    for text in padded:
+        start = time.perf_counter()
+        assert parser.parse(text) is None
+        assert parser.parse(text, strict=False) is None
+        assert time.perf_counter() - start < 1.0
+
+
+if __name__ == "__main__":
+    test_parses_well_formed_response()
+    test_whitespace_padding_is_not_quadratic()
+    print("ok")